@@ -5,7 +5,6 @@ import subprocess
 import uuid
 import json
 import logging
-import tempfile
 import zipfile
 import io
 import shutil
@@ -13,11 +12,9 @@ from datetime import datetime
 import torch
 import whisper
 
-from utils import process_audio, create_zip_file
-
-# 確保臨時目錄存在
-TEMP_DIR = os.path.join(tempfile.gettempdir(), 'whisper_subtitle_tool')
-os.makedirs(TEMP_DIR, exist_ok=True)
+from scratch import TEMP_DIR, ARCHIVE_TTL, ScratchQuotaError, scratch
+from utils import process_batch
+from fingerprint import dedup_report
 
 # 設定日誌
 logging.basicConfig(
@@ -30,6 +27,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 日誌設定完成後才執行暫存空間清理，清除紀錄才會寫入 app.log
+scratch.run_janitor()
+
 # 初始化全局變量
 if 'model' not in st.session_state:
     try:
@@ -515,8 +515,10 @@ st.markdown("""
 # 初始化 session state
 if 'processed' not in st.session_state:
     st.session_state.processed = False
-if 'outputs' not in st.session_state:
-    st.session_state.outputs = None
+if 'archive_dir' not in st.session_state:
+    st.session_state.archive_dir = None
+if 'archive_path' not in st.session_state:
+    st.session_state.archive_path = None
 if 'filename' not in st.session_state:
     st.session_state.filename = None
 if 'status_message' not in st.session_state:
@@ -528,15 +530,27 @@ if 'processing' not in st.session_state:
 if 'downloaded' not in st.session_state:
     st.session_state.downloaded = False
 
+def release_archive():
+    if st.session_state.archive_dir:
+        scratch.release(st.session_state.archive_dir)
+    st.session_state.archive_dir = None
+    st.session_state.archive_path = None
+
 def main():
     st.title("智能字幕提取系統")
+
+    # 每次執行時回收逾時未下載的壓縮檔，本工作階段的壓縮檔若已被回收則重置狀態
+    scratch.release_expired()
+    if st.session_state.archive_dir and not scratch.is_active(st.session_state.archive_dir):
+        st.session_state.archive_dir = None
+        st.session_state.archive_path = None
     
     st.markdown('<div class="section-title">選擇影音檔：</div>', unsafe_allow_html=True)
     
-    uploaded_file = st.file_uploader(
+    uploaded_files = st.file_uploader(
             "",
             type=['mp3', 'wav', 'mp4', 'mkv', 'avi', 'mov', 'wmv', 'flv', 'webm'],
-            
+            accept_multiple_files=True,
             on_change=lambda: setattr(st.session_state, 'downloaded', False)
         )
     st.markdown('<div class="section-title">選擇輸出格式：</div>', unsafe_allow_html=True)
@@ -564,39 +578,96 @@ def main():
     )
 
     with col1:
-        if st.button('開始提取', disabled=not (uploaded_file and formats) or st.session_state.processing):
+        if st.button('開始提取', disabled=not (uploaded_files and formats) or st.session_state.processing):
+            completed = False
             try:
                 st.session_state.processing = True
                 st.session_state.downloaded = False
                 st.session_state.status_message = "字幕提取中..."
                 st.session_state.status_type = "info"
-                
+                release_archive()
+
+                # 壓縮檔放在磁碟上的暫存工作目錄（不使用 tmpfs），逐檔寫入直到使用者下載
+                archive_dir = scratch.allocate(tmpfs=False)
+                st.session_state.archive_dir = archive_dir
+                archive_path = os.path.join(archive_dir, 'subtitles.zip')
+
+                progress_bar = status_area.progress(0.0)
+                file_rows = [status_area.empty() for _ in uploaded_files]
+                for row, file in zip(file_rows, uploaded_files):
+                    row.markdown(f"⏳ {file.name}")
+
+                failed = []
+                deferred = []
                 with st.spinner('正在提取字幕...'):
-                    outputs = process_audio(uploaded_file, formats)
-                    st.session_state.outputs = outputs
-                    st.session_state.filename = os.path.splitext(uploaded_file.name)[0]
-                    st.session_state.processed = True
+                    for done, (i, error) in enumerate(process_batch(uploaded_files, formats, archive_path), 1):
+                        name = uploaded_files[i].name
+                        if isinstance(error, ScratchQuotaError):
+                            deferred.append(name)
+                            logger.warning(f"{name} 暫存空間不足，未處理：{str(error)}")
+                            file_rows[i].markdown(f"⏸️ {name}：暫存空間不足，請稍後重試")
+                        elif error:
+                            failed.append(name)
+                            logger.error(f"{name} 處理失敗：{str(error)}")
+                            file_rows[i].markdown(f"❌ {name}：{str(error)}")
+                        else:
+                            file_rows[i].markdown(f"✅ {name}")
+                        if os.path.exists(archive_path):
+                            scratch.update_reservation(archive_dir, os.path.getsize(archive_path))
+                        progress_bar.progress(done / len(uploaded_files))
+
+                report = dedup_report()
+                logger.info(f"重複音訊命中率 {report['hit_rate']:.0%}，累計節省約 {report['saved_compute_seconds']:.0f} 秒運算")
+                if len(deferred) == len(uploaded_files):
+                    raise ScratchQuotaError("暫存空間不足，請稍後再試")
+                if len(failed) + len(deferred) == len(uploaded_files):
+                    raise RuntimeError("所有檔案皆處理失敗")
+                if len(uploaded_files) == 1:
+                    st.session_state.filename = os.path.splitext(uploaded_files[0].name)[0]
+                else:
+                    st.session_state.filename = f"batch_{datetime.now():%Y%m%d_%H%M%S}"
+                st.session_state.archive_path = archive_path
+                # 處理完成才開始計算保留時間，逾時未下載（例如分頁已關閉）即回收
+                scratch.expire_after(archive_dir, ARCHIVE_TTL)
+                completed = True
+                st.session_state.processed = True
+                if deferred:
+                    st.session_state.status_message = f"處理完成，{len(deferred)} 個檔案因暫存空間不足未處理，請稍後重試；其餘請點擊右側按鈕下載"
+                    st.session_state.status_type = "warning"
+                elif failed:
+                    st.session_state.status_message = f"處理完成，{len(failed)} 個檔案失敗！請點擊右側按鈕下載字幕檔"
+                    st.session_state.status_type = "warning"
+                else:
                     st.session_state.status_message = "處理完成！請點擊右側按鈕下載字幕檔"
                     st.session_state.status_type = "success"
+            except ScratchQuotaError as e:
+                st.session_state.status_message = str(e)
+                st.session_state.status_type = "warning"
+                st.session_state.processed = False
             except Exception as e:
                 msg = f"處理失敗：{str(e)}"
                 st.session_state.status_message = msg
                 st.session_state.status_type = "error"
                 st.session_state.processed = False
             finally:
+                # 失敗或被中斷（Streamlit 重新執行、關閉分頁時拋出的不是 Exception）都釋放壓縮檔目錄
+                if not completed:
+                    release_archive()
                 st.session_state.processing = False
                
 
     with col2:
-        if st.session_state.get('outputs') and not st.session_state.get('downloaded', False):
-            zip_file = create_zip_file(st.session_state.outputs, st.session_state.filename)
-            if st.download_button(
-                label='下載字幕檔',
-                data=zip_file,
-                file_name=f"{st.session_state.filename}_subtitles.zip",
-                mime='application/zip',
-                #use_container_width=True
-            ):
+        if st.session_state.get('archive_path') and not st.session_state.get('downloaded', False):
+            with open(st.session_state.archive_path, 'rb') as zip_file:
+                clicked = st.download_button(
+                    label='下載字幕檔',
+                    data=zip_file,
+                    file_name=f"{st.session_state.filename}_subtitles.zip",
+                    mime='application/zip',
+                    #use_container_width=True
+                )
+            if clicked:
+                release_archive()
                 st.session_state.downloaded = True
                 st.session_state.status_message = "下載完成！可以繼續處理新的檔案"
                 st.session_state.status_type = "success"
@@ -608,13 +679,20 @@ def main():
   
 
     # 狀態提示根據狀況自動補上
-    if not uploaded_file:
+    if not uploaded_files:
         st.session_state.status_message = "請選擇要處理的影音檔案"
         st.session_state.status_type = "info"
     elif not formats:
         st.session_state.status_message = "請至少選擇一種輸出格式"
         st.session_state.status_type = "warning"
 
+    report = dedup_report()
+    if report['lookups']:
+        st.caption(
+            f"重複音訊重用：命中 {report['hits']}/{report['lookups']}（{report['hit_rate']:.0%}），"
+            f"略過 {report['saved_audio_seconds'] / 60:.1f} 分鐘音訊，約節省 {report['saved_compute_seconds'] / 60:.1f} 分鐘運算"
+        )
+
     
 
 if __name__ == '__main__':
@@ -0,0 +1,284 @@
+import os
+import json
+import sqlite3
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+
+from search_index import INDEX_DIR
+
+FINGERPRINT_DB = os.path.join(INDEX_DIR, "fingerprints.db")
+
+SAMPLE_RATE = 16000
+FRAME_SIZE = 4096
+HOP_SIZE = 512           # 每個子指紋間隔 32 毫秒，重疊足夠才能容忍裁切造成的錯位
+NUM_BANDS = 33           # 33 個頻帶相鄰差分得到 32 位元子指紋
+MIN_FREQ = 300
+MAX_FREQ = 2000
+CHUNK_FRAMES = 1024      # 分段計算 FFT，避免長音檔一次展開所有 frame
+
+MAX_QUERY_HASHES = 2000  # 查詢時最多取 2000 個子指紋（平均分布於整段音檔）做雜湊比對
+MIN_VOTES = 3
+MAX_CANDIDATES = 5
+MAX_BIT_ERROR_RATE = 0.35
+MIN_OVERLAP_SECONDS = 10.0   # 連續比對成功至少 10 秒才重用字幕，其餘部分另行轉錄
+BLOCK_FRAMES = 64            # 每 64 個子指紋（約 2 秒）為一區塊分別計算位元錯誤率
+MIN_BLOCK_FRAMES = 16        # 尾端不足此長度的零頭併入前一個區塊
+EDGE_SLACK_SECONDS = 0.5     # 未涵蓋的頭尾短於此長度時視為已涵蓋
+SEGMENT_TOLERANCE = 0.1      # 片段超出涵蓋範圍在此長度內時視為位於範圍內（偏移以 frame 為單位量化）
+
+logger = logging.getLogger(__name__)
+_lock = threading.Lock()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    duration REAL NOT NULL,
+    fp BLOB NOT NULL,
+    segments TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS hashes (
+    hash INTEGER NOT NULL,
+    fp_id INTEGER NOT NULL,
+    pos INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_hashes_hash ON hashes (hash);
+CREATE TABLE IF NOT EXISTS stats (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+
+def _connect():
+    conn = sqlite3.connect(FINGERPRINT_DB, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _band_edges():
+    edges = np.geomspace(MIN_FREQ, MAX_FREQ, NUM_BANDS + 1)
+    return np.round(edges * FRAME_SIZE / SAMPLE_RATE).astype(int)
+
+
+def compute_fingerprint(audio):
+    # Haitsma-Kalker 式指紋：比較相鄰頻帶能量差在時間上的變化，對重新編碼與音量差異不敏感
+    audio = np.asarray(audio, dtype=np.float32)
+    if len(audio) < FRAME_SIZE:
+        return np.zeros(0, dtype=np.uint32)
+
+    num_frames = 1 + (len(audio) - FRAME_SIZE) // HOP_SIZE
+    window = np.hanning(FRAME_SIZE).astype(np.float32)
+    edges = _band_edges()
+    energies = np.empty((num_frames, NUM_BANDS), dtype=np.float64)
+    offsets = np.arange(FRAME_SIZE)
+    for start in range(0, num_frames, CHUNK_FRAMES):
+        stop = min(start + CHUNK_FRAMES, num_frames)
+        index = np.arange(start, stop)[:, None] * HOP_SIZE + offsets
+        power = np.abs(np.fft.rfft(audio[index] * window, axis=1)) ** 2
+        energies[start:stop] = np.add.reduceat(power[:, edges[0]:edges[-1]], edges[:-1] - edges[0], axis=1)
+
+    band_diff = energies[:, :-1] - energies[:, 1:]
+    bits = (band_diff[1:] - band_diff[:-1]) > 0
+    weights = (1 << np.arange(NUM_BANDS - 1, dtype=np.uint64))
+    return (bits.astype(np.uint64) @ weights).astype(np.uint32)
+
+
+def _bit_error_rate(query, stored, offset):
+    begin = max(0, -offset)
+    end = min(len(query), len(stored) - offset)
+    if end <= begin:
+        return 1.0, 0
+    diff = np.bitwise_xor(query[begin:end], stored[begin + offset:end + offset])
+    errors = np.unpackbits(diff.view(np.uint8)).sum()
+    return errors / (32 * (end - begin)), end - begin
+
+
+def _matching_run(query, stored, offset):
+    # 逐區塊計算位元錯誤率，回傳錯誤率低於門檻的最長連續區段（以新音檔的 frame 為單位）；
+    # 整段平均會被大段不相干的內容稀釋，只有逐區塊比對才能找出真正相同的範圍
+    begin = max(0, -offset)
+    end = min(len(query), len(stored) - offset)
+    best = (0, 0)
+    run_start = None
+    block = begin
+    while block < end:
+        block_end = block + BLOCK_FRAMES
+        if end - block_end < MIN_BLOCK_FRAMES:
+            block_end = end
+        ber, _ = _bit_error_rate(query[block:block_end], stored[block + offset:block_end + offset], 0)
+        if ber <= MAX_BIT_ERROR_RATE:
+            if run_start is None:
+                run_start = block
+            if block_end - run_start > best[1] - best[0]:
+                best = (run_start, block_end)
+        else:
+            run_start = None
+        block = block_end
+    return best
+
+
+def _reuse_segments(segments, offset_seconds, covered_start, covered_end):
+    # 已知音檔的時間軸平移到新音檔，只重用完整落在涵蓋範圍內的片段；
+    # 跨越邊界的片段不重用，並把涵蓋範圍縮到該片段之外，讓頭尾轉錄完整包含這段語音而不重複
+    reused = []
+    for seg in segments:
+        start = seg["start"] - offset_seconds
+        end = seg["end"] - offset_seconds
+        if end <= covered_start + SEGMENT_TOLERANCE or start >= covered_end - SEGMENT_TOLERANCE:
+            continue
+        if start < covered_start - SEGMENT_TOLERANCE:
+            covered_start = end
+        elif end > covered_end + SEGMENT_TOLERANCE:
+            covered_end = start
+        else:
+            reused.append({
+                "start": round(max(start, covered_start), 3),
+                "end": round(min(end, covered_end), 3),
+                "text": seg["text"]
+            })
+    reused = [seg for seg in reused if seg["start"] >= covered_start and seg["end"] <= covered_end]
+    return reused, covered_start, covered_end
+
+
+def _bump_stats(conn, **values):
+    conn.executemany(
+        "INSERT INTO stats (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = value + excluded.value",
+        values.items()
+    )
+
+
+def _vote(conn, fp):
+    positions = defaultdict(list)
+    step = max(1, len(fp) // MAX_QUERY_HASHES)
+    for q in range(0, len(fp), step):
+        if fp[q]:
+            positions[int(fp[q])].append(q)
+
+    votes = defaultdict(int)
+    keys = list(positions)
+    for i in range(0, len(keys), 500):
+        batch = keys[i:i + 500]
+        rows = conn.execute(
+            f"SELECT hash, fp_id, pos FROM hashes WHERE hash IN ({','.join('?' * len(batch))})",
+            batch
+        )
+        for h, fp_id, pos in rows:
+            for q in positions[h]:
+                votes[(fp_id, pos - q)] += 1
+    ranked = sorted(votes.items(), key=lambda item: item[1], reverse=True)
+    return [candidate for candidate, count in ranked[:MAX_CANDIDATES] if count >= MIN_VOTES]
+
+
+def find_duplicate(fp, duration):
+    # 以雜湊投票找出候選音檔與時間偏移，再逐區塊以位元錯誤率確認實際相同的範圍
+    conn = _connect()
+    try:
+        match = None
+        if len(fp):
+            for fp_id, offset in _vote(conn, fp):
+                name, blob, segments = conn.execute(
+                    "SELECT name, fp, segments FROM fingerprints WHERE id = ?", (fp_id,)
+                ).fetchone()
+                stored = np.frombuffer(blob, dtype=np.uint32)
+                # 投票的偏移可能因裁切錯位差一格，前後各試一格取錯誤率最低者
+                ber, overlap, offset = min(
+                    (*_bit_error_rate(fp, stored, offset + d), offset + d) for d in (-1, 0, 1)
+                )
+                run_start, run_end = _matching_run(fp, stored, offset)
+                if (run_end - run_start) * HOP_SIZE / SAMPLE_RATE < MIN_OVERLAP_SECONDS:
+                    continue
+
+                # 新音檔中實際與已知音檔相同的時間範圍（秒）
+                covered_start = run_start * HOP_SIZE / SAMPLE_RATE
+                covered_end = min(duration, run_end * HOP_SIZE / SAMPLE_RATE)
+                if covered_start <= EDGE_SLACK_SECONDS:
+                    covered_start = 0.0
+                if run_end == len(fp) or duration - covered_end <= EDGE_SLACK_SECONDS:
+                    covered_end = duration
+                offset_seconds = offset * HOP_SIZE / SAMPLE_RATE
+                reused, covered_start, covered_end = _reuse_segments(
+                    json.loads(segments), offset_seconds, covered_start, covered_end
+                )
+                if covered_end - covered_start < MIN_OVERLAP_SECONDS:
+                    continue
+                match = {
+                    "name": name,
+                    "offset": offset_seconds,
+                    "bit_error_rate": float(ber),
+                    "covered": (covered_start, covered_end),
+                    "segments": reused
+                }
+                break
+
+        with _lock, conn:
+            _bump_stats(
+                conn,
+                lookups=1,
+                hits=1 if match else 0,
+                saved_audio_seconds=match["covered"][1] - match["covered"][0] if match else 0.0
+            )
+        if match:
+            logger.info(
+                f"音訊指紋命中 {match['name']}（偏移 {match['offset']:.1f} 秒，BER {match['bit_error_rate']:.2f}），"
+                f"重用 {match['covered'][0]:.1f}–{match['covered'][1]:.1f} 秒的既有字幕"
+            )
+        return match
+    finally:
+        conn.close()
+
+
+def register_fingerprint(name, fp, duration, segments, transcribe_seconds, transcribed_audio_seconds=None):
+    rows = [
+        {"start": seg["start"], "end": seg["end"], "text": seg["text"]}
+        for seg in segments
+    ]
+    with _lock:
+        conn = _connect()
+        try:
+            with conn:
+                fp_id = conn.execute(
+                    "INSERT INTO fingerprints (name, duration, fp, segments, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (name, duration, fp.astype(np.uint32).tobytes(), json.dumps(rows, ensure_ascii=False),
+                     datetime.now().isoformat(timespec="seconds"))
+                ).lastrowid
+                conn.executemany(
+                    "INSERT INTO hashes (hash, fp_id, pos) VALUES (?, ?, ?)",
+                    ((int(h), fp_id, pos) for pos, h in enumerate(fp) if h)
+                )
+                _bump_stats(
+                    conn,
+                    transcribed_audio_seconds=duration if transcribed_audio_seconds is None else transcribed_audio_seconds,
+                    transcribe_seconds=transcribe_seconds
+                )
+        finally:
+            conn.close()
+    return fp_id
+
+
+def dedup_report():
+    conn = _connect()
+    try:
+        stats = dict(conn.execute("SELECT key, value FROM stats"))
+    finally:
+        conn.close()
+    lookups = int(stats.get("lookups", 0))
+    hits = int(stats.get("hits", 0))
+    saved_audio = stats.get("saved_audio_seconds", 0.0)
+    transcribed_audio = stats.get("transcribed_audio_seconds", 0.0)
+    # 以實際轉錄的平均即時率（運算秒數 / 音訊秒數）估算命中所省下的運算時間
+    real_time_factor = stats.get("transcribe_seconds", 0.0) / transcribed_audio if transcribed_audio else 0.0
+    return {
+        "lookups": lookups,
+        "hits": hits,
+        "hit_rate": hits / lookups if lookups else 0.0,
+        "saved_audio_seconds": saved_audio,
+        "saved_compute_seconds": saved_audio * real_time_factor,
+    }
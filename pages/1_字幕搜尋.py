@@ -0,0 +1,91 @@
+import html
+
+import streamlit as st
+
+from search_index import search, index_stats, format_ms
+
+SEARCH_LIMIT = 100
+
+st.set_page_config(
+    page_title="字幕搜尋",
+    page_icon="🔍",
+    layout="centered"
+)
+
+st.markdown("""
+<style>
+    .stApp {
+        background-color: #1E1E1E;
+    }
+
+    h1, .section-title {
+        color: #FFFFFF !important;
+    }
+
+    h1 {
+        text-align: center;
+        padding: 20px 0;
+    }
+
+    .section-title {
+        font-size: 1.2em;
+        margin: 20px 0 10px 0;
+        font-weight: 500;
+    }
+
+    .search-hit {
+        background-color: rgba(52, 73, 94, 0.7);
+        border-left: 3px solid #4A90E2;
+        border-radius: 5px;
+        padding: 10px 14px;
+        margin: 8px 0;
+        color: #FFFFFF;
+    }
+
+    .search-hit .hit-time {
+        color: rgb(30, 200, 200);
+        font-family: monospace;
+        margin-right: 10px;
+    }
+
+    #MainMenu, footer {
+        visibility: hidden;
+    }
+</style>
+""", unsafe_allow_html=True)
+
+
+def main():
+    st.title("字幕全文搜尋")
+
+    stats = index_stats()
+    st.caption(f"已索引 {stats['documents']} 個檔案、{stats['segments']} 個字幕片段")
+
+    st.markdown('<div class="section-title">搜尋關鍵字：</div>', unsafe_allow_html=True)
+    query = st.text_input("", placeholder="輸入要搜尋的字詞，例如：會議結論")
+    if not query.strip():
+        return
+
+    results, truncated = search(query, limit=SEARCH_LIMIT)
+    if not results:
+        st.info("找不到符合的字幕片段")
+        return
+
+    if truncated:
+        summary = f"結果超過 {SEARCH_LIMIT} 筆，僅顯示前 {SEARCH_LIMIT} 筆（請輸入更精確的關鍵字）："
+    else:
+        summary = f"共 {len(results)} 筆結果："
+    st.markdown(f'<div class="section-title">{summary}</div>', unsafe_allow_html=True)
+    current_file = None
+    for hit in results:
+        if hit['file'] != current_file:
+            current_file = hit['file']
+            st.markdown(f"**{html.escape(current_file)}**")
+        st.markdown(
+            f'<div class="search-hit"><span class="hit-time">{format_ms(hit["start_ms"])} → {format_ms(hit["end_ms"])}</span>{html.escape(hit["text"])}</div>',
+            unsafe_allow_html=True
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+import os
+import sys
+import time
+import uuid
+import shutil
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+
+TEMP_DIR = os.path.join(tempfile.gettempdir(), 'whisper_subtitle_tool')
+SCRATCH_ROOT = os.path.join(TEMP_DIR, 'scratch')
+
+# 小檔案優先放在 tmpfs（記憶體檔案系統），僅在系統有 /dev/shm 時啟用
+TMPFS_ROOT = os.path.join('/dev/shm', 'whisper_subtitle_tool') if os.path.isdir('/dev/shm') else None
+TMPFS_MAX_FILE_BYTES = 64 * 1024 * 1024
+TMPFS_QUOTA_BYTES = 512 * 1024 * 1024
+
+QUOTA_BYTES = 4 * 1024 * 1024 * 1024
+MIN_FREE_BYTES = 512 * 1024 * 1024   # 磁碟至少保留的剩餘空間
+FREE_SPACE_POLL = 5                  # 等待配額時重新檢查磁碟剩餘空間的間隔（秒）
+WAIT_TIMEOUT = 300
+ORPHAN_MAX_AGE = 24 * 60 * 60
+ARCHIVE_TTL = 60 * 60                # 等待下載的壓縮檔最多保留一小時
+
+# 舊版直接放在相對路徑 temp_audio/ 與 TEMP_DIR 底下的上傳檔，啟動時一併清除
+LEGACY_DIRS = ("temp_audio",)
+KEEP_FILES = ("app.log",)
+
+logger = logging.getLogger(__name__)
+
+
+class ScratchQuotaError(Exception):
+    pass
+
+
+def _pid_alive(pid):
+    if pid == os.getpid():
+        return True
+    if sys.platform == 'win32':
+        import ctypes
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)
+        if not handle:
+            return False
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ScratchManager:
+    def __init__(self, root=SCRATCH_ROOT, quota_bytes=QUOTA_BYTES, tmpfs_root=TMPFS_ROOT,
+                 tmpfs_max_file_bytes=TMPFS_MAX_FILE_BYTES, tmpfs_quota_bytes=TMPFS_QUOTA_BYTES,
+                 min_free_bytes=MIN_FREE_BYTES):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.min_free_bytes = min_free_bytes
+        self.tmpfs_root = tmpfs_root
+        self.tmpfs_max_file_bytes = tmpfs_max_file_bytes
+        self.tmpfs_quota_bytes = tmpfs_quota_bytes
+        self._cond = threading.Condition()
+        # 工作目錄 -> (預留位元組數, 是否位於 tmpfs, 到期時間或 None)
+        self._active = {}
+        self._janitor_done = False
+        os.makedirs(self.root, exist_ok=True)
+        if self.tmpfs_root:
+            os.makedirs(self.tmpfs_root, exist_ok=True)
+
+    def _reserved(self, on_tmpfs):
+        return sum(size for size, tmpfs, _ in self._active.values() if tmpfs == on_tmpfs)
+
+    def _disk_available(self):
+        # 配額與實際剩餘空間取較小者，避免在剩餘空間小於配額的磁碟上寫滿
+        free = shutil.disk_usage(self.root).free - self.min_free_bytes
+        return min(self.quota_bytes - self._reserved(False), free)
+
+    def _fits_tmpfs(self, size_hint):
+        return (
+            self.tmpfs_root is not None
+            and size_hint <= self.tmpfs_max_file_bytes
+            and self._reserved(True) + size_hint <= self.tmpfs_quota_bytes
+        )
+
+    def allocate(self, size_hint=0, timeout=WAIT_TIMEOUT, tmpfs=True):
+        if size_hint > self.quota_bytes:
+            raise ScratchQuotaError(f"檔案大小超過暫存空間上限（{self.quota_bytes // (1024 * 1024)} MB）")
+
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            # 磁碟配額用完時阻塞新工作，直到其他工作釋放空間或逾時
+            while True:
+                on_tmpfs = tmpfs and self._fits_tmpfs(size_hint)
+                if on_tmpfs or size_hint <= self._disk_available():
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise ScratchQuotaError("暫存空間不足，請稍後再試")
+                # 其他程序也可能釋放磁碟空間，因此定期醒來重新檢查
+                self._cond.wait(min(remaining, FREE_SPACE_POLL))
+
+            base = self.tmpfs_root if on_tmpfs else self.root
+            path = os.path.join(base, f"{os.getpid()}-{uuid.uuid4().hex}")
+            os.makedirs(path)
+            self._active[path] = (size_hint, on_tmpfs, None)
+        return path
+
+    def release(self, path):
+        try:
+            shutil.rmtree(path, ignore_errors=True)
+        finally:
+            with self._cond:
+                self._active.pop(path, None)
+                self._cond.notify_all()
+
+    def update_reservation(self, path, size):
+        # 內容會持續增長的目錄（例如逐檔寫入的壓縮檔）以實際大小更新預留量
+        with self._cond:
+            if path in self._active:
+                _, on_tmpfs, expires_at = self._active[path]
+                self._active[path] = (size, on_tmpfs, expires_at)
+                self._cond.notify_all()
+
+    def expire_after(self, path, ttl):
+        # 從現在起算 ttl 秒後由 release_expired 回收
+        with self._cond:
+            if path in self._active:
+                size, on_tmpfs, _ = self._active[path]
+                self._active[path] = (size, on_tmpfs, time.monotonic() + ttl)
+
+    def release_expired(self):
+        # 執行期間回收已過期的目錄（例如使用者關閉分頁後沒有下載的壓縮檔）
+        now = time.monotonic()
+        with self._cond:
+            expired = [path for path, (_, _, expires_at) in self._active.items()
+                       if expires_at is not None and expires_at <= now]
+        for path in expired:
+            self.release(path)
+        if expired:
+            logger.info(f"已回收 {len(expired)} 個過期的暫存目錄")
+        return len(expired)
+
+    def is_active(self, path):
+        with self._cond:
+            return path in self._active
+
+    @contextmanager
+    def job(self, size_hint=0, timeout=WAIT_TIMEOUT):
+        # 不論成功、失敗或被中斷（Streamlit 重新執行會在腳本中拋出例外），都會清除工作目錄
+        path = self.allocate(size_hint, timeout)
+        try:
+            yield path
+        finally:
+            self.release(path)
+
+    def cleanup_orphans(self, max_age=ORPHAN_MAX_AGE):
+        removed = 0
+        now = time.time()
+        for base in filter(None, (self.root, self.tmpfs_root)):
+            for entry in os.scandir(base):
+                with self._cond:
+                    if entry.path in self._active:
+                        continue
+                pid = entry.name.split('-', 1)[0]
+                owner_gone = not pid.isdigit() or not _pid_alive(int(pid))
+                try:
+                    expired = now - entry.stat().st_mtime > max_age
+                except FileNotFoundError:
+                    continue
+                if owner_gone or expired:
+                    if entry.is_dir(follow_symlinks=False):
+                        shutil.rmtree(entry.path, ignore_errors=True)
+                    else:
+                        os.remove(entry.path)
+                    removed += 1
+        if removed:
+            logger.info(f"已清除 {removed} 個遺留的暫存項目")
+        return removed
+
+    def cleanup_legacy(self):
+        removed = 0
+        for path in LEGACY_DIRS:
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        for entry in os.scandir(TEMP_DIR):
+            if entry.is_file(follow_symlinks=False) and entry.name not in KEEP_FILES:
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except OSError:
+                    pass
+        if removed:
+            logger.info(f"已清除 {removed} 個舊版暫存項目")
+        return removed
+
+    def run_janitor(self):
+        # 回收先前程序遺留（例如當機或強制結束）的暫存目錄與舊版暫存位置；
+        # Streamlit 每次互動都會重新執行 app.py，因此每個程序只執行一次
+        with self._cond:
+            if self._janitor_done:
+                return
+            self._janitor_done = True
+        self.cleanup_orphans()
+        self.cleanup_legacy()
+
+
+scratch = ScratchManager()
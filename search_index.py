@@ -0,0 +1,168 @@
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+INDEX_DIR = "index_data"
+os.makedirs(INDEX_DIR, exist_ok=True)
+INDEX_DB = os.path.join(INDEX_DIR, "transcripts.db")
+
+_lock = threading.Lock()
+
+# 中日韓文字（漢字、假名、諺文）逐字切分，其餘以英數字詞切分
+_CJK_RANGES = (
+    "\u3040-\u30ff"   # 平假名、片假名
+    "\u3400-\u4dbf"   # CJK 擴充 A
+    "\u4e00-\u9fff"   # CJK 統一漢字
+    "\uac00-\ud7af"   # 韓文音節
+    "\uf900-\ufaff"   # CJK 相容漢字
+)
+_TOKEN_RE = re.compile(f"[{_CJK_RANGES}]+|[0-9a-z]+")
+_CJK_RE = re.compile(f"[{_CJK_RANGES}]")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    doc_id INTEGER NOT NULL REFERENCES documents(id),
+    start_ms INTEGER NOT NULL,
+    end_ms INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    norm TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    token TEXT NOT NULL,
+    segment_id INTEGER NOT NULL,
+    PRIMARY KEY (token, segment_id)
+) WITHOUT ROWID;
+"""
+
+
+def _connect():
+    conn = sqlite3.connect(INDEX_DB, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def normalize_text(text):
+    return text.lower().strip()
+
+
+def format_ms(ms):
+    seconds, ms = divmod(ms, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{ms:03d}"
+
+
+def tokenize(text):
+    # 中文沒有空白分詞，索引時同時存單字與相鄰雙字（bigram），
+    # 查詢時只需用雙字交集即可定位詞組，單字查詢則退回單字索引
+    tokens = set()
+    for run in _TOKEN_RE.findall(normalize_text(text)):
+        if _CJK_RE.match(run):
+            tokens.update(run)
+            tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.add(run)
+    return tokens
+
+
+def _query_runs(query):
+    return _TOKEN_RE.findall(normalize_text(query))
+
+
+def _compact(text):
+    # 只保留字詞本身並依原順序串接，忽略空白與標點，「AI模型」與「AI 模型」視為相同詞組
+    return "".join(_TOKEN_RE.findall(normalize_text(text)))
+
+
+def _query_tokens(query):
+    tokens = set()
+    for run in _query_runs(query):
+        if _CJK_RE.match(run) and len(run) > 1:
+            tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.add(run)
+    return tokens
+
+
+def add_transcript(name, segments):
+    rows = [
+        (int(round(seg["start"] * 1000)), int(round(seg["end"] * 1000)), seg["text"].strip())
+        for seg in segments
+        if seg["text"].strip()
+    ]
+    with _lock:
+        conn = _connect()
+        try:
+            with conn:
+                doc_id = conn.execute(
+                    "INSERT INTO documents (name, created_at) VALUES (?, ?)",
+                    (name, datetime.now().isoformat(timespec="seconds"))
+                ).lastrowid
+                for start_ms, end_ms, text in rows:
+                    segment_id = conn.execute(
+                        "INSERT INTO segments (doc_id, start_ms, end_ms, text, norm) VALUES (?, ?, ?, ?, ?)",
+                        (doc_id, start_ms, end_ms, text, normalize_text(text))
+                    ).lastrowid
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO postings (token, segment_id) VALUES (?, ?)",
+                        ((token, segment_id) for token in tokenize(text))
+                    )
+        finally:
+            conn.close()
+    return doc_id
+
+
+def search(query, limit=100):
+    tokens = _query_tokens(query)
+    if not tokens:
+        return [], False
+    # 先從倒排索引取交集候選，再確認整個查詢依序、相鄰地出現在原文中
+    placeholders = ",".join("?" * len(tokens))
+    phrase = _compact(query)
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            f"""
+            SELECT d.name, s.start_ms, s.end_ms, s.text, s.norm
+            FROM segments s
+            JOIN documents d ON d.id = s.doc_id
+            WHERE s.id IN (
+                SELECT segment_id FROM postings
+                WHERE token IN ({placeholders})
+                GROUP BY segment_id
+                HAVING COUNT(*) = ?
+            )
+            ORDER BY d.id DESC, s.start_ms
+            """,
+            (*tokens, len(tokens))
+        )
+        results = []
+        for name, start_ms, end_ms, text, norm in rows:
+            if phrase in _compact(norm):
+                if len(results) >= limit:
+                    # 多取一筆以判斷結果是否被截斷
+                    return results, True
+                results.append({"file": name, "start_ms": start_ms, "end_ms": end_ms, "text": text})
+        return results, False
+    finally:
+        conn.close()
+
+
+def index_stats():
+    conn = _connect()
+    try:
+        documents = conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        segments = conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+        return {"documents": documents, "segments": segments}
+    finally:
+        conn.close()
@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+
+import fingerprint
+from fingerprint import SAMPLE_RATE, compute_fingerprint, dedup_report, find_duplicate, register_fingerprint
+
+
+def make_audio(seconds, seed):
+    # 以頻率滑動的諧波、音節般的開關與少量雜訊模擬語音
+    rng = np.random.default_rng(seed)
+    t = np.arange(seconds * SAMPLE_RATE) / SAMPLE_RATE
+    audio = np.zeros_like(t)
+    for freq in rng.uniform(400, 1800, 3):
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * rng.uniform(0.5, 4) * t + rng.uniform(0, 6))
+        audio += np.sin(2 * np.pi * (freq + 200 * np.sin(2 * np.pi * 0.7 * t)) * t) * envelope
+    audio *= np.sin(2 * np.pi * rng.uniform(3, 5) * t) > -0.2
+    audio += 0.05 * rng.normal(0, 1, len(t))
+    return (audio / np.abs(audio).max()).astype(np.float32)
+
+
+def reencode(audio, seed):
+    # 模擬重新編碼：音量改變並加入少量雜訊
+    rng = np.random.default_rng(seed)
+    return (audio * 0.7 + rng.normal(0, 0.02, len(audio))).astype(np.float32)
+
+
+def segments_for(duration, length=5.0):
+    return [
+        {"start": i * length, "end": (i + 1) * length, "text": f"s{i}"}
+        for i in range(int(duration // length))
+    ]
+
+
+@pytest.fixture(autouse=True)
+def fingerprint_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(fingerprint, "FINGERPRINT_DB", str(tmp_path / "fingerprints.db"))
+
+
+@pytest.fixture
+def known():
+    audio = make_audio(200, seed=1)
+    # 已登錄的音檔為 50–170 秒，字幕每 5 秒一段
+    stored = audio[50 * SAMPLE_RATE:170 * SAMPLE_RATE]
+    register_fingerprint("known.mp4", compute_fingerprint(stored), 120.0, segments_for(120.0), 30.0)
+    return audio
+
+
+def lookup(audio, start, end):
+    clip = reencode(audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)], seed=7)
+    return find_duplicate(compute_fingerprint(clip), end - start)
+
+
+def test_trimmed_copy_is_fully_covered(known):
+    match = lookup(known, 80, 140)
+
+    assert match["offset"] == pytest.approx(30.0, abs=0.05)
+    assert match["covered"] == (0.0, 60.0)
+    assert [seg["text"] for seg in match["segments"]] == [f"s{i}" for i in range(6, 18)]
+    assert match["segments"][0]["start"] == pytest.approx(0.0, abs=0.05)
+
+
+def test_copy_running_past_known_end_covers_only_overlap(known):
+    # 新音檔 150–190 秒，只有前 20 秒與已登錄音檔相同
+    match = lookup(known, 150, 190)
+
+    covered_start, covered_end = match["covered"]
+    assert covered_start == 0.0
+    # 跨越結尾邊界的片段不重用，涵蓋範圍最多縮短一個片段
+    assert 14.5 <= covered_end <= 20.5
+    assert all(seg["end"] <= covered_end for seg in match["segments"])
+    assert [seg["text"] for seg in match["segments"]][0] == "s20"
+
+
+def test_unrelated_head_is_not_covered(known):
+    # 前 20 秒是不相干的內容，後 60 秒取自已登錄音檔的 60–120 秒
+    head = make_audio(20, seed=99)
+    clip = np.concatenate([head, known[60 * SAMPLE_RATE:120 * SAMPLE_RATE]])
+    match = find_duplicate(compute_fingerprint(reencode(clip, seed=3)), 80.0)
+
+    covered_start, covered_end = match["covered"]
+    assert covered_start >= 19.0
+    assert covered_end == 80.0
+    assert all(seg["start"] >= covered_start for seg in match["segments"])
+    # 已登錄音檔 10 秒之前的字幕不可被拿來當作新音檔開頭的內容
+    assert "s0" not in [seg["text"] for seg in match["segments"]]
+    assert "s1" not in [seg["text"] for seg in match["segments"]]
+
+
+def test_boundary_segment_is_left_for_transcription(known):
+    # 從已登錄音檔第 12 秒開始，s2（10–15 秒）跨越開頭邊界，必須交給 Whisper 重新轉錄
+    match = lookup(known, 62, 122)
+
+    covered_start, _ = match["covered"]
+    texts = [seg["text"] for seg in match["segments"]]
+    assert "s2" not in texts
+    assert texts[0] == "s3"
+    assert covered_start == pytest.approx(3.0, abs=0.05)
+
+
+def test_unrelated_audio_does_not_match(known):
+    assert find_duplicate(compute_fingerprint(make_audio(60, seed=42)), 60.0) is None
+
+
+def test_dedup_report_counts_covered_audio(known):
+    lookup(known, 80, 140)
+    find_duplicate(compute_fingerprint(make_audio(60, seed=42)), 60.0)
+
+    report = dedup_report()
+    assert report["lookups"] == 2
+    assert report["hits"] == 1
+    assert report["hit_rate"] == pytest.approx(0.5)
+    assert report["saved_audio_seconds"] == pytest.approx(60.0)
+    # 登錄時 120 秒音訊花費 30 秒運算，即時率 0.25
+    assert report["saved_compute_seconds"] == pytest.approx(15.0)
@@ -4,14 +4,25 @@ import json
 import subprocess
 import io
 import zipfile
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import timedelta
 import torch
 import whisper
 
-TEMP_DIR = "temp_audio"
-os.makedirs(TEMP_DIR, exist_ok=True)
+from search_index import add_transcript
+from scratch import scratch
+from fingerprint import SAMPLE_RATE, compute_fingerprint, find_duplicate, register_fingerprint
+
+logger = logging.getLogger(__name__)
 
 model = whisper.load_model("base")
+# 常駐模型的解碼流程會掛上 kv-cache hook，不能同時執行多個轉錄
+_model_lock = threading.Lock()
+
+BATCH_WORKERS = 2
 
 def format_timestamp(seconds, always_include_hours=False):
     milliseconds = round(seconds * 1000.0)
@@ -74,13 +85,60 @@ def write_vtt(segments):
         output.append("")
     return "\n".join(output)
 
-def process_audio(file, formats):
-    temp_filename = os.path.join(TEMP_DIR, f"{uuid.uuid4()}.mp3")
-    with open(temp_filename, "wb") as f:
-        f.write(file.getbuffer())
+def transcribe_file(file):
+    # 上傳檔案寫入獨立的工作目錄，轉錄失敗或中斷時也會一併清除
+    with scratch.job(file.size) as work_dir:
+        temp_filename = os.path.join(work_dir, f"{uuid.uuid4()}{os.path.splitext(file.name)[1] or '.mp3'}")
+        with open(temp_filename, "wb") as f:
+            f.write(file.getbuffer())
+
+        # ffmpeg 解碼為 16 kHz 音訊，可與其他檔案的轉錄並行
+        audio = whisper.load_audio(temp_filename)
+
+    # 計算音訊指紋，重新編碼或裁切過的相同內容可直接重用先前的字幕
+    duration = len(audio) / SAMPLE_RATE
+    fp = compute_fingerprint(audio)
+
+    with _model_lock:
+        # 在模型鎖內查詢，同一批次中重複的檔案也能命中前一個檔案的結果
+        match = find_duplicate(fp, duration)
+        if match and match["covered"] == (0.0, duration):
+            return {"segments": match["segments"]}
+
+        # 用 Whisper 轉錄；部分重疊時只轉錄未被已知音檔涵蓋的頭尾
+        start = time.monotonic()
+        if match:
+            covered_start, covered_end = match["covered"]
+            segments = (
+                transcribe_range(audio, 0.0, covered_start)
+                + match["segments"]
+                + transcribe_range(audio, covered_end, duration)
+            )
+            transcribed_audio = duration - (covered_end - covered_start)
+        else:
+            segments = model.transcribe(audio, fp16=False)["segments"]
+            transcribed_audio = duration
+        elapsed = time.monotonic() - start
 
-    # 用 Whisper 轉錄
-    result = model.transcribe(temp_filename, fp16=False)
+        # 指紋登錄失敗不影響已完成的轉錄結果
+        try:
+            register_fingerprint(file.name, fp, duration, segments, elapsed, transcribed_audio)
+        except Exception as e:
+            logger.warning(f"{file.name} 音訊指紋登錄失敗：{str(e)}")
+        return {"segments": segments}
+
+def transcribe_range(audio, start, end):
+    # 轉錄音訊的一段區間，並把時間軸平移回整段音檔
+    if end - start <= 0:
+        return []
+    result = model.transcribe(audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)], fp16=False)
+    return [
+        {"start": seg["start"] + start, "end": seg["end"] + start, "text": seg["text"]}
+        for seg in result["segments"]
+    ]
+
+def process_audio(file, formats):
+    result = transcribe_file(file)
 
     segments = merge_short_segments(result["segments"])
     outputs = {}
@@ -104,13 +162,52 @@ def process_audio(file, formats):
                 ]
             }, ensure_ascii=False, indent=2)
 
-    os.remove(temp_filename)
+    # 完成的逐字稿加入全文檢索索引；索引失敗不影響已產生的字幕
+    try:
+        add_transcript(file.name, segments)
+    except Exception as e:
+        logger.warning(f"{file.name} 加入搜尋索引失敗：{str(e)}")
     return outputs
 
-def create_zip_file(outputs, filename_prefix):
-    memory_file = io.BytesIO()
-    with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
+def create_zip_file(outputs, filename_prefix, path=None, folder=None):
+    # 指定 path 時直接附加到磁碟上的壓縮檔，批次處理可逐檔寫入
+    arc_prefix = f"{folder}/{filename_prefix}" if folder else filename_prefix
+    target = path or io.BytesIO()
+    mode = 'a' if path and os.path.exists(path) else 'w'
+    with zipfile.ZipFile(target, mode, zipfile.ZIP_DEFLATED) as zf:
         for fmt, content in outputs.items():
-            zf.writestr(f"{filename_prefix}.{fmt}", content)
-    memory_file.seek(0)
-    return memory_file
+            zf.writestr(f"{arc_prefix}.{fmt}", content)
+    if path:
+        return path
+    target.seek(0)
+    return target
+
+def unique_folder_names(files):
+    names = []
+    for file in files:
+        base = name = os.path.splitext(file.name)[0]
+        n = 1
+        while name in names:
+            n += 1
+            name = f"{base}_{n}"
+        names.append(name)
+    return names
+
+def process_batch(files, formats, archive_path, max_workers=BATCH_WORKERS):
+    folders = unique_folder_names(files)
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {executor.submit(process_audio, file, formats): i for i, file in enumerate(files)}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                outputs = future.result()
+            except Exception as e:
+                yield i, e
+                continue
+            # 每完成一個檔案就寫入壓縮檔，不在記憶體中累積所有結果
+            create_zip_file(outputs, folders[i], path=archive_path, folder=folders[i] if len(files) > 1 else None)
+            yield i, None
+    finally:
+        # 使用者中斷（Streamlit 重新執行）時取消尚未開始的檔案
+        executor.shutdown(wait=False, cancel_futures=True)